@@ -0,0 +1,103 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import altair as alt
+import pandas as pd
+from report import (RANGE_OPTIONS, build_charts, compute_report, report_dir,
+                    report_to_json, source_fingerprint)
+from storage import PAIN_LOG, load_entries
+
+
+# Scheduled batch generation of report snapshots.
+#
+#   python batch_reports.py --logs "patients/*.csv"          # every hour
+#   python batch_reports.py --logs pain_log.csv --once
+#
+# Every log (one per patient) is handled by a worker in a process pool. For
+# each time range the worker runs the same computations as the reports page
+# and writes, next to the log in <log>_reports/:
+#   snapshot.json        metrics and chart data for every range
+#   <range>.vl.json      Vega-Lite specs of the three charts
+#   <range>.html         the three charts as a static page
+# display_reports serves snapshot.json while the log is unchanged and the
+# snapshot is from today, and computes the report live otherwise.
+
+
+def slug(range_option):
+    return range_option.lower().replace(" ", "_")
+
+
+def write_atomic(path, text):
+    with open(path + ".tmp", "w") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def generate_reports(csv_file):
+    # Returns (csv_file, seconds) so the scheduler can log progress
+    started = time.perf_counter()
+    # Fingerprint before loading, so rows written meanwhile make it stale
+    source = source_fingerprint(csv_file)
+    df = load_entries(csv_file)
+    today = pd.Timestamp.today().normalize()
+
+    folder = report_dir(csv_file)
+    os.makedirs(folder, exist_ok=True)
+    reports = {}
+    for range_option in RANGE_OPTIONS:
+        report = compute_report(df, range_option, today)
+        reports[range_option] = report_to_json(report)
+
+        charts = build_charts(report)
+        write_atomic(os.path.join(folder, f"{slug(range_option)}.vl.json"),
+                     json.dumps([chart.to_dict() for chart in charts]))
+        write_atomic(os.path.join(folder, f"{slug(range_option)}.html"),
+                     alt.vconcat(*charts).to_html())
+
+    # Written last: the page only trusts the charts' data through this file
+    snapshot = {
+        "source": source,
+        "generated": datetime.date.today().isoformat(),
+        "reports": reports,
+    }
+    write_atomic(os.path.join(folder, "snapshot.json"), json.dumps(snapshot))
+    return csv_file, time.perf_counter() - started
+
+
+def run(patterns, workers=None, interval=3600, once=False):
+    while True:
+        logs = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(generate_reports, log) for log in logs]
+            for log, future in zip(logs, futures):
+                try:
+                    _, seconds = future.result()
+                    print(f"{log}: {seconds:.2f}s")
+                except Exception as e:
+                    print(f"{log}: failed to generate reports: {e}")
+        print(f"Generated reports for {len(logs)} logs "
+              f"in {time.perf_counter() - started:.2f}s")
+        if once:
+            break
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute report snapshots")
+    parser.add_argument("--logs", nargs="+", default=[PAIN_LOG],
+                        help="pain log files or glob patterns, one log per patient")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="process pool size (default: CPU count)")
+    parser.add_argument("--interval", type=float, default=3600,
+                        help="seconds between runs")
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+    try:
+        run(args.logs, args.workers, args.interval, args.once)
+    except KeyboardInterrupt:
+        pass
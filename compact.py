@@ -0,0 +1,37 @@
+import argparse
+import time
+from storage import PAIN_LOG, compact, read_manifest
+
+
+# Background compaction of the pain log.
+#
+#   python compact.py               # compact every 5 minutes
+#   python compact.py --once        # compact once and exit
+
+
+def run(filename, interval, once=False):
+    while True:
+        started = time.perf_counter()
+        folded = compact(filename)
+        if folded is None:
+            print("Another compaction is still running, skipping this one")
+        elif folded:
+            manifest = read_manifest(filename)
+            print(f"Compacted {folded} rows into generation {manifest['generation']} "
+                  f"in {time.perf_counter() - started:.2f}s")
+        if once:
+            break
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact the pain log into snapshots")
+    parser.add_argument("--file", default=PAIN_LOG)
+    parser.add_argument("--interval", type=float, default=300,
+                        help="seconds between compactions")
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+    try:
+        run(args.file, args.interval, args.once)
+    except KeyboardInterrupt:
+        pass
@@ -1,7 +1,6 @@
 import streamlit as st
 import pandas as pd
-import os
-import re
+from storage import append_entries, extract_number
 
 
 def display_create_entry():
@@ -59,19 +58,8 @@ def display_create_entry():
             index=index
         )
 
-    def extract_number(value):
-        if isinstance(value, str):
-            match = re.search(r'\d+', value)
-            if match:
-                return int(match.group())
-        return value
-
     def save_submission(data: dict, filename="pain_log.csv"):
-        df = pd.DataFrame([data])  # one-row dataframe
-        if os.path.exists(filename):
-            df.to_csv(filename, mode='a', header=False, index=False)
-        else:
-            df.to_csv(filename, index=False)
+        append_entries([data], filename)
 
     # Title + Date
     st.title("🩺 Log your pain")
@@ -0,0 +1,131 @@
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+import shared_dataset
+from storage import (PAIN_LOG, SCORE_FIELDS, dedupe_sorted,
+                     read_entries_with_offset, read_log_tail)
+
+
+# Dense per-day copies of the pain scores, one int8 array per BPI item and
+# log (one log per user), indexed by days since Jan 1 of the first logged
+# year. Days without an entry hold MISSING. The arrays are built once per
+# process and afterwards only the rows appended to the log are applied.
+# Updates produce new arrays (copy-on-write), so a snapshot returned by
+# get_daily_arrays never changes while a session is drawing from it.
+
+MISSING = -1
+
+# Per-log arrays, kept for the lifetime of the process
+cache = {}
+cache_lock = threading.Lock()
+
+
+def jan_first(year):
+    return np.datetime64(f"{year:04d}-01-01", "D")
+
+
+def resize(arrays, first, last):
+    # New arrays covering day offsets first..last (relative to the current
+    # start), keeping the start on a Jan 1. Returns (arrays, shift applied).
+    start, shift = arrays["start"], 0
+    if first < 0:
+        start = jan_first((start + np.timedelta64(first, "D")).astype(object).year)
+        shift = int((arrays["start"] - start).astype(int))
+    length = max(last + shift + 1, len(next(iter(arrays["values"].values()))) + shift)
+    values = {}
+    for column, old in arrays["values"].items():
+        values[column] = np.full(length, MISSING, dtype=np.int8)
+        values[column][shift:shift + len(old)] = old
+    return {"start": start, "values": values}, shift
+
+
+def apply(arrays, df: pd.DataFrame):
+    # Returns new arrays with the de-duplicated entries written in; the arrays
+    # passed in are left untouched
+    if df.empty:
+        return arrays
+    offsets = (df["date"].to_numpy().astype("datetime64[D]") - arrays["start"]).astype(np.int64)
+    length = len(arrays["values"]["bpi5"])
+    if offsets.min() < 0 or offsets.max() >= length:
+        arrays, shift = resize(arrays, int(offsets.min()), int(offsets.max()))
+        offsets += shift
+    else:
+        arrays = {"start": arrays["start"],
+                  "values": {column: values.copy() for column, values in arrays["values"].items()}}
+    for column in SCORE_FIELDS:
+        scores = pd.to_numeric(df[column], errors="coerce").fillna(MISSING)
+        arrays["values"][column][offsets] = scores.to_numpy().astype(np.int8)
+    return arrays
+
+
+def build(df: pd.DataFrame):
+    today = np.datetime64(datetime.date.today(), "D")
+    if df.empty:
+        start = jan_first(datetime.date.today().year)
+    else:
+        start = jan_first(df["date"].min().year)
+    length = int((today - start).astype(int)) + 1
+    arrays = {
+        "start": start,
+        "values": {column: np.full(length, MISSING, dtype=np.int8) for column in SCORE_FIELDS},
+    }
+    return apply(arrays, df)
+
+
+def get_daily_arrays(filename=PAIN_LOG):
+    # Consistent {"start", "values", "log_offset"} snapshot, shared and
+    # read-only for callers; the log's rows appended since are swapped in as
+    # a new snapshot
+    with cache_lock:
+        arrays = cache.get(filename)
+        if arrays is None:
+            # Build from the shared memory-mapped copy when one is published;
+            # otherwise parse the log without keeping the frame around, since
+            # the arrays are all this module needs
+            loaded = shared_dataset.load_entries_with_offset(filename)
+            if loaded is None:
+                loaded = read_entries_with_offset(filename)
+            df, log_offset = loaded
+            arrays = build(df)
+        else:
+            tail, log_offset = read_log_tail(filename, arrays["log_offset"])
+            if log_offset == arrays["log_offset"]:
+                return arrays
+            arrays = apply(arrays, dedupe_sorted(tail))
+        arrays = {"start": arrays["start"], "values": arrays["values"], "log_offset": log_offset}
+        cache[filename] = arrays
+        return arrays
+
+
+def years(arrays):
+    first = arrays["start"].astype(object).year
+    return list(range(first, datetime.date.today().year + 1))
+
+
+def to_grid(days, fill, start):
+    # Lay one value per day of a year out as 7 x 54 (weekday x week of year)
+    # Monday = 0; 1970-01-01 was a Thursday
+    first_weekday = (start.astype(np.int64) + 3) % 7
+    grid = np.full(7 * 54, fill, dtype=days.dtype)
+    grid[first_weekday:first_weekday + len(days)] = days
+    return grid.reshape(54, 7).T
+
+
+def year_grid(arrays, column, year):
+    # 7 x 54 matrix of scores, NaN where missing
+    start, end = jan_first(year), jan_first(year + 1)
+    days = int((end - start).astype(int))
+    offset = int((start - arrays["start"]).astype(int))
+    values = arrays["values"][column][max(offset, 0):offset + days]
+
+    scores = np.full(days, np.nan)
+    scores[:len(values)] = np.where(values == MISSING, np.nan, values)
+    return to_grid(scores, np.nan, start)
+
+
+def year_dates(year):
+    # 7 x 54 matrix of ISO dates matching year_grid, "" outside the year
+    start, end = jan_first(year), jan_first(year + 1)
+    dates = np.arange(start, end).astype(str).astype(object)
+    return to_grid(dates, "", start)
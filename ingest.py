@@ -0,0 +1,405 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from storage import PAIN_LOG, COLUMNS, SCORE_FIELDS, append_entries
+
+
+# Local ingestion API for mobile/wearable clients.
+#
+#   python ingest.py serve --port 8502
+#   python ingest.py bench --entries 20000
+#
+# POST /entries accepts one entry (JSON object) or a batch (JSON list) in the
+# same schema as save_submission in create_entry.py. Valid entries are put on a
+# bounded queue and appended to the pain log by a single writer task, so the
+# reports page reads the same file as before.
+#
+# A 202 only means "queued". If an append fails the writer keeps the rows and
+# retries with backoff; meanwhile /health reports unhealthy and new entries
+# get 503. Rows still unwritten at shutdown go to <log>.deadletter.jsonl.
+
+MAX_BODY_BYTES = 1_000_000
+MAX_ENTRIES_PER_REQUEST = 1000
+QUEUE_SIZE = 256          # pending requests, not entries
+WRITE_BATCH = 5000        # max entries per append
+ENQUEUE_TIMEOUT = 2.0     # seconds before answering 503 when the queue is full
+RETRY_DELAY = 0.5         # first retry after a failed append, doubled up to
+MAX_RETRY_DELAY = 30.0    # this many seconds
+SHUTDOWN_TIMEOUT = 10.0   # seconds to flush the queue before spilling it
+MAX_TEXT_LENGTH = 100     # same cap as the treatment field in the form
+
+STATUS_TEXT = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+def parse_score(value, field):
+    # Plain integers or digit-only strings; bpi8 may also be written "60 %"
+    # as the form shows it. Anything else ("-3", "7.9", "🟠 5") is rejected.
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        pattern = r"([0-9]+)( ?%)?" if field == "bpi8" else r"([0-9]+)"
+        match = re.fullmatch(pattern, value)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def validate_entry(entry):
+    # Returns (row, errors); row is None when the entry is rejected
+    if not isinstance(entry, dict):
+        return None, ["entry must be a JSON object"]
+
+    errors = []
+    unknown = set(entry) - set(COLUMNS)
+    if unknown:
+        errors.append(f"unknown fields: {', '.join(sorted(unknown))}")
+
+    date = None
+    try:
+        date = datetime.date.fromisoformat(str(entry.get("date")))
+        if date > datetime.date.today():
+            errors.append("date: must not be in the future")
+    except ValueError:
+        errors.append("date: expected YYYY-MM-DD")
+
+    bpi1 = entry.get("bpi1")
+    if bpi1 not in ("Yes", "No"):
+        errors.append("bpi1: expected 'Yes' or 'No'")
+
+    row = {
+        "date": date,
+        "bpi1": bpi1,
+        "bpi2": entry.get("bpi2") or "",
+        "bpi7": entry.get("bpi7") or "",
+    }
+    for field in ("bpi2", "bpi7"):
+        value = row[field]
+        if not isinstance(value, str):
+            errors.append(f"{field}: expected a string")
+        elif len(value) > MAX_TEXT_LENGTH:
+            errors.append(f"{field}: at most {MAX_TEXT_LENGTH} characters")
+        elif any(ord(c) < 32 or ord(c) == 127 for c in value):
+            # A line break would split the row in the line-based log
+            errors.append(f"{field}: must not contain control characters")
+
+    limits = {field: 10 for field in SCORE_FIELDS}
+    limits["bpi8"] = 100
+    for field, upper in limits.items():
+        # A no-pain report may leave the scores out, as the form does
+        default = 0 if bpi1 == "No" or field == "bpi8" else None
+        value = parse_score(entry.get(field, default), field)
+        if value is None or not 0 <= value <= upper:
+            errors.append(f"{field}: expected an integer from 0 to {upper}")
+        elif bpi1 == "No" and value != 0:
+            # The form's no-pain report writes zeros only
+            errors.append(f"{field}: must be 0 when bpi1 is 'No'")
+        row[field] = value
+
+    if errors:
+        return None, errors
+    return row, []
+
+
+def spill(rows, filename):
+    # Last resort for rows that could not be appended to the log: next to the
+    # log, else in the temp dir, else on stderr
+    lines = "".join(json.dumps({**row, "date": row["date"].isoformat()}) + "\n"
+                    for row in rows)
+    name = os.path.basename(filename) + ".deadletter.jsonl"
+    for folder in (os.path.dirname(os.path.abspath(filename)), tempfile.gettempdir()):
+        path = os.path.join(folder, name)
+        try:
+            with open(path, "a") as f:
+                f.write(lines)
+            print(f"Wrote {len(rows)} unwritten entries to {path}")
+            return
+        except OSError:
+            continue
+    print(f"Could not save {len(rows)} unwritten entries:\n{lines}", file=sys.stderr)
+
+
+async def writer_loop(queue: asyncio.Queue, health, filename):
+    # Single writer: drain whatever is queued and append it in one go
+    loop = asyncio.get_running_loop()
+    rows = []
+    try:
+        while True:
+            batches = [await queue.get()]
+            rows = list(batches[0])
+            while len(rows) < WRITE_BATCH and not queue.empty():
+                batch = queue.get_nowait()
+                batches.append(batch)
+                rows.extend(batch)
+
+            delay = RETRY_DELAY
+            while True:
+                try:
+                    await loop.run_in_executor(None, append_entries, rows, filename)
+                    break
+                except Exception as e:
+                    health.update(ok=False, error=str(e))
+                    print(f"Failed to write {len(rows)} entries, retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+
+            health.update(ok=True, error=None)
+            rows = []
+            for _ in batches:
+                queue.task_done()
+    except asyncio.CancelledError:
+        # Shutting down: keep whatever is in flight or still queued
+        while not queue.empty():
+            rows.extend(queue.get_nowait())
+        if rows:
+            spill(rows, filename)
+        raise
+
+
+async def send_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+
+async def handle_request(method, path, body, queue: asyncio.Queue, health):
+    if path == "/health":
+        if not health["ok"]:
+            return 503, {"status": "unhealthy", "error": health["error"],
+                         "queued_requests": queue.qsize()}
+        return 200, {"status": "ok", "queued_requests": queue.qsize()}
+    if path != "/entries":
+        return 404, {"error": "not found"}
+    if method != "POST":
+        return 405, {"error": "use POST"}
+    if not health["ok"]:
+        return 503, {"error": f"pain log is not writable, retry later ({health['error']})"}
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return 400, {"error": "body must be valid JSON"}
+
+    entries = payload if isinstance(payload, list) else [payload]
+    if not entries:
+        return 400, {"error": "no entries"}
+    if len(entries) > MAX_ENTRIES_PER_REQUEST:
+        return 413, {"error": f"at most {MAX_ENTRIES_PER_REQUEST} entries per request"}
+
+    rows = []
+    rejected = []
+    for i, entry in enumerate(entries):
+        row, errors = validate_entry(entry)
+        if errors:
+            rejected.append({"index": i, "errors": errors})
+        else:
+            rows.append(row)
+
+    # A batch is accepted or rejected as a whole
+    if rejected:
+        return 400, {"error": "validation failed", "rejected": rejected}
+
+    try:
+        await asyncio.wait_for(queue.put(rows), ENQUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return 503, {"error": "ingestion queue is full, retry later"}
+    return 202, {"accepted": len(rows)}
+
+
+async def handle_client(reader, writer, queue: asyncio.Queue, health):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, path, version = request_line.decode().split()
+            except ValueError:
+                await send_response(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            try:
+                length = int(headers.get("content-length", 0) or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                await send_response(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                break
+            if length > MAX_BODY_BYTES:
+                await send_response(writer, 413, {"error": "body too large"}, keep_alive=False)
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            keep_alive = (version == "HTTP/1.1"
+                          and headers.get("connection", "").lower() != "close")
+            status, payload = await handle_request(method, path.split("?")[0], body, queue, health)
+            await send_response(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    except ValueError:
+        # Undecodable headers or a line over the stream limit
+        try:
+            await send_response(writer, 400, {"error": "malformed request"}, keep_alive=False)
+        except ConnectionError:
+            pass
+    finally:
+        writer.close()
+
+
+async def start_server(host="127.0.0.1", port=8502, filename=PAIN_LOG):
+    # Returns (server, queue, writer_task) so callers can flush and shut down
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    health = {"ok": True, "error": None}
+    writer_task = asyncio.create_task(writer_loop(queue, health, filename))
+    server = await asyncio.start_server(
+        lambda r, w: handle_client(r, w, queue, health), host, port)
+    return server, queue, writer_task
+
+
+async def shutdown(server, queue: asyncio.Queue, writer_task):
+    # Stop accepting, give the writer a chance to flush, spill the rest
+    server.close()
+    await server.wait_closed()
+    try:
+        await asyncio.wait_for(queue.join(), SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
+    writer_task.cancel()
+    try:
+        await writer_task
+    except asyncio.CancelledError:
+        pass
+
+
+async def serve(host, port, filename):
+    server, queue, writer_task = await start_server(host, port, filename)
+    print(f"Ingesting into {filename} on http://{host}:{port}/entries")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await shutdown(server, queue, writer_task)
+
+
+# --- Local test harness ---
+
+def random_entry(day: datetime.date):
+    has_pain = random.random() > 0.1
+    entry = {"date": day.isoformat(), "bpi1": "Yes" if has_pain else "No"}
+    if has_pain:
+        entry["bpi2"] = ", ".join(random.sample(["Head", "Neck", "Back", "Leg", "Arm"], 2))
+        entry["bpi7"] = random.choice(["", "Yoga", "Painkillers", "Long walk"])
+        entry["bpi8"] = f"{random.randrange(0, 101, 10)} %"
+    for field in SCORE_FIELDS:
+        entry[field] = random.randint(0, 10) if has_pain else 0
+    return entry
+
+
+async def post_batches(host, port, batches):
+    reader, writer = await asyncio.open_connection(host, port)
+    statuses = []
+    for batch in batches:
+        body = json.dumps(batch).encode()
+        writer.write(
+            f"POST /entries HTTP/1.1\r\nHost: {host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+            + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+        statuses.append(status)
+    writer.close()
+    return statuses
+
+
+async def bench(entries, batch_size, connections):
+    today = datetime.date.today()
+    payload = [random_entry(today - datetime.timedelta(days=i % 3650)) for i in range(entries)]
+    batches = [payload[i:i + batch_size] for i in range(0, entries, batch_size)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "pain_log.csv")
+        server, queue, writer_task = await start_server("127.0.0.1", 0, filename)
+        port = server.sockets[0].getsockname()[1]
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            post_batches("127.0.0.1", port, batches[i::connections])
+            for i in range(connections)
+        ])
+        accepted_at = time.perf_counter() - start
+        await queue.join()
+        flushed_at = time.perf_counter() - start
+
+        await shutdown(server, queue, writer_task)
+
+        statuses = [s for r in results for s in r]
+        with open(filename) as f:
+            written = sum(1 for _ in f) - 1
+
+    print(f"Requests: {len(statuses)} ({statuses.count(202)} accepted, "
+          f"{statuses.count(503)} rejected by backpressure)")
+    print(f"Entries written: {written} / {entries}")
+    print(f"Accepted in {accepted_at:.2f}s, flushed in {flushed_at:.2f}s "
+          f"-> {written / flushed_at:,.0f} entries/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pain log ingestion API")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = sub.add_parser("serve", help="run the ingestion server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8502)
+    serve_parser.add_argument("--file", default=PAIN_LOG)
+
+    bench_parser = sub.add_parser("bench", help="load test against a temporary log")
+    bench_parser.add_argument("--entries", type=int, default=20000)
+    bench_parser.add_argument("--batch-size", type=int, default=100)
+    bench_parser.add_argument("--connections", type=int, default=8)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.file))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(bench(args.entries, args.batch_size, args.connections))
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from shared_dataset import rss_mb
+from storage import SCORE_FIELDS, append_entries
+
+
+# Load test of one real Streamlit server with concurrent browser sessions.
+#
+#   python loadtest.py --sessions 1,5,10,25 --iterations 3
+#
+# For every concurrency level a fresh `streamlit run home.py` is started in a
+# temporary directory with a synthetic log. N clients then talk to it over the
+# websocket protocol the browser uses: each session logs in, opens the reports
+# page, switches through every time range, submits a pain entry and goes back
+# home. A rerun is timed from sending the widget change until the server has
+# finished the script (including reruns triggered by st.rerun). Memory is the
+# server process's PSS with all N sessions still connected, minus the PSS after
+# a warm-up session, so it answers how many users one server process can hold.
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "home.py")
+RANGES = ["Last 7 days", "Last month", "Last year", "All time"]
+WIDGETS = {"button", "radio", "selectbox", "multiselect", "text_input", "date_input"}
+SERVER_TIMEOUT = 60
+
+
+def write_synthetic_log(filename, days):
+    today = datetime.date.today()
+    rows = []
+    for i in range(days):
+        entry = {"date": today - datetime.timedelta(days=days - i), "bpi1": "Yes",
+                 "bpi2": ", ".join(random.sample(["Head", "Neck", "Back", "Leg", "Arm"], 2)),
+                 "bpi7": random.choice(["", "Yoga", "Painkillers", "Long walk"]),
+                 "bpi8": random.randrange(0, 101, 10)}
+        entry.update({field: random.randint(0, 10) for field in SCORE_FIELDS})
+        rows.append(entry)
+    append_entries(rows, filename)
+
+
+# --- Server ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, port):
+    log = open(os.path.join(workdir, "server.log"), "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP,
+         "--server.headless=true", f"--server.port={port}",
+         "--server.fileWatcherType=none", "--browser.gatherUsageStats=false"],
+        cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + SERVER_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit exited, see {log.name}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"streamlit did not start within {SERVER_TIMEOUT}s")
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+# --- Client ---
+#
+# A session is {"ws", "page", "widgets", "states"}: the connection, the page
+# script hash, the widgets of the last run by (type, label) and the widget
+# values the browser would send back on the next rerun.
+
+async def rerun(session, samples, step, trigger=None):
+    msg = BackMsg()
+    msg.rerun_script.query_string = ""
+    msg.rerun_script.page_script_hash = session["page"]
+    msg.rerun_script.widget_states.widgets.extend(session["states"].values())
+    if trigger is not None:
+        msg.rerun_script.widget_states.widgets.add(id=trigger, trigger_value=True)
+
+    started = time.perf_counter()
+    await session["ws"].send(msg.SerializeToString())
+    widgets = {}
+    while True:
+        forward = ForwardMsg()
+        forward.ParseFromString(await session["ws"].recv())
+        kind = forward.WhichOneof("type")
+        if kind == "new_session":
+            # Every script run starts over, also after st.rerun()
+            session["page"] = forward.new_session.page_script_hash
+            widgets = {}
+        elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+            element = forward.delta.new_element
+            name = element.WhichOneof("type")
+            if name == "exception":
+                raise RuntimeError(f"{step} failed: {element.exception.message}")
+            if name in WIDGETS:
+                widget = getattr(element, name)
+                widgets[(name, widget.label)] = widget
+        elif kind == "script_finished" and \
+                forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+            break
+    samples.append((step, time.perf_counter() - started))
+
+    # Like the browser, only send values of widgets that are still shown
+    ids = {widget.id for widget in widgets.values()}
+    session["widgets"] = widgets
+    session["states"] = {id: state for id, state in session["states"].items() if id in ids}
+
+
+def find(session, kind, label):
+    for (name, widget_label), widget in session["widgets"].items():
+        if name == kind and widget_label.startswith(label):
+            return widget
+    raise RuntimeError(f"no {kind} '{label}' on the page")
+
+
+def set_value(session, widget, value):
+    state = WidgetState(id=widget.id)
+    if isinstance(value, list):
+        state.string_array_value.data.extend(value)
+    else:
+        state.string_value = value
+    session["states"][widget.id] = state
+
+
+async def click(session, samples, step, label):
+    await rerun(session, samples, step, trigger=find(session, "button", label).id)
+
+
+async def run_session(url, session_id, iterations, samples, finished, release):
+    # Reports to finished once done, then stays connected until release is set
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        session = {"ws": ws, "page": "", "widgets": {}, "states": {}}
+        await rerun(session, samples, "start")
+
+        set_value(session, find(session, "text_input", "Username"), f"user{session_id}")
+        set_value(session, find(session, "text_input", "Password"), "password")
+        await click(session, samples, "login", "Login")
+
+        for _ in range(iterations):
+            await click(session, samples, "open reports", "📊")
+            for option in RANGES:
+                set_value(session, find(session, "radio", "**Select time range**"), option)
+                await rerun(session, samples, "switch range")
+
+            await click(session, samples, "open entry form", "➕")
+            set_value(session, find(session, "radio", "Have you had any pain today"), "Yes")
+            await rerun(session, samples, "answer form")
+            set_value(session, find(session, "multiselect", "Please select the area"),
+                      [random.choice(["Neck", "Back", "Leg"])])
+            for (kind, _), widget in session["widgets"].items():
+                if kind == "selectbox":
+                    set_value(session, widget, random.choice(widget.options))
+            await click(session, samples, "submit entry", "Submit")
+
+            await click(session, samples, "go home", "🏠")
+
+        finished.put_nowait(None)
+        await release.wait()
+
+
+async def run_level(url, sessions, iterations, server_pid):
+    samples = []
+    finished = asyncio.Queue()
+    release = asyncio.Event()
+
+    async def guarded(session_id):
+        try:
+            await run_session(url, session_id, iterations, samples, finished, release)
+        except Exception as e:
+            finished.put_nowait(e)
+
+    tasks = [asyncio.create_task(guarded(i)) for i in range(sessions)]
+    started = time.perf_counter()
+    try:
+        for _ in range(sessions):
+            error = await finished.get()
+            if error is not None:
+                raise error
+        elapsed = time.perf_counter() - started
+        # Measured while every session (and its state) is still connected
+        server_mb = rss_mb(server_pid)
+    finally:
+        release.set()
+        await asyncio.gather(*tasks)
+    return samples, elapsed, server_mb
+
+
+def summarize(latencies):
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return f"{p50:8.1f} {p95:8.1f} {p99:8.1f}"
+
+
+def main(levels, iterations, days, by_step):
+    workdir = tempfile.mkdtemp(prefix="pain_loadtest_")
+    try:
+        shutil.copy(os.path.join(os.path.dirname(APP), "styles.css"), workdir)
+        write_synthetic_log(os.path.join(workdir, "pain_log.csv"), days)
+
+        print(f"{'sessions':>8} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'reruns/s':>9} {'server MB':>10} {'MB/session':>11}")
+        for sessions in levels:
+            # A fresh server per level, so earlier sessions don't skew memory
+            port = free_port()
+            server = start_server(workdir, port)
+            url = f"ws://127.0.0.1:{port}/_stcore/stream"
+            try:
+                # Warm-up: imports and caches are loaded before the baseline
+                asyncio.run(run_level(url, 1, 1, server.pid))
+                baseline_mb = rss_mb(server.pid)
+                samples, elapsed, server_mb = asyncio.run(
+                    run_level(url, sessions, iterations, server.pid))
+            finally:
+                stop_server(server)
+
+            print(f"{sessions:8d} {len(samples):7d} {summarize([s for _, s in samples])} "
+                  f"{len(samples) / elapsed:9.1f} {server_mb:10.1f} "
+                  f"{(server_mb - baseline_mb) / sessions:11.1f}")
+            if by_step:
+                for step in dict.fromkeys(step for step, _ in samples):
+                    latencies = [s for name, s in samples if name == step]
+                    print(f"{'':8} {step:>16} {summarize(latencies)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of one server")
+    parser.add_argument("--sessions", default="1,5,10",
+                        help="comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=2,
+                        help="report/entry rounds per session")
+    parser.add_argument("--days", type=int, default=730,
+                        help="days of synthetic data in the log")
+    parser.add_argument("--by-step", action="store_true",
+                        help="also print latency percentiles per step")
+    args = parser.parse_args()
+    main([int(n) for n in args.sessions.split(",")], args.iterations, args.days, args.by_step)
@@ -1,73 +1,92 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import altair as alt
+import datetime
+import json
 import os
-
-
-def display_reports():
-    st.title("Your Pain Report")
-
-    # Load CSV
-    csv_file = "pain_log.csv"
-
-    # Guard clause against missing file
-    if not os.path.exists(csv_file):
-        st.warning(
-            "⚠️ No data found. Please create an entry first.")
-        return
-
-    # Read CSV with date parsing
-    df = pd.read_csv(csv_file, sep=";", parse_dates=["date"])
-    df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors='coerce')
-
-    # Sort by date (if not already)
-    df = df.sort_values("date")
-
-    # Data frame for display - should be removed in the final version
-    # st.subheader(
-    #     "🗂 Logged Pain Data (I DON'T THINK THIS SHOULD BE AT THE TOP IN THE FINAL VERSION)")
-    # st.dataframe(df, use_container_width=True)
-
-    # Choose time range
-    range_option = st.radio(
-        "**Select time range**",
-        ["Last 7 days", "Last month", "Last year", "All time"],
-        horizontal=True
-    )
-
-    # Choose period
+from collections import Counter
+from storage import load_entries
+import daily_values
+import shared_dataset
+
+
+RANGE_OPTIONS = ["Last 7 days", "Last month", "Last year", "All time"]
+
+# Define pain variables to plot (excluding bpi6)
+pain_col_labels = {
+    "bpi3": "Worst",
+    "bpi4": "Least",
+    "bpi5": "Average"
+}
+
+interference_vars = ["bpi9a", "bpi9b", "bpi9c",
+                     "bpi9d", "bpi9e", "bpi9f", "bpi9g"]
+
+labels = {
+    "bpi9a": "General Activity",
+    "bpi9b": "Mood",
+    "bpi9c": "Walking",
+    "bpi9d": "Normal Work",
+    "bpi9e": "Relations",
+    "bpi9f": "Sleep",
+    "bpi9g": "Enjoyment of Life"
+}
+
+# Items selectable in the pain calendar
+heatmap_labels = {
+    "bpi3": "Worst Pain",
+    "bpi4": "Least Pain",
+    "bpi5": "Average Pain",
+    "bpi6": "Pain Right Now",
+    **{var: f"Interference: {label}" for var, label in labels.items()}
+}
+
+
+def get_period(range_option):
     if range_option == "Last 7 days":
-        period = "Weekly"
+        return "Weekly"
     elif range_option == "Last month":
-        period = "Monthly"
+        return "Monthly"
     elif range_option == "Last year":
-        period = "Yearly"
+        return "Yearly"
     else:
-        period = "All Time"
+        return "All Time"
 
-    # Date filter
-    if df['date'].dropna().empty:
-        st.warning("No valid dates available in the data.")
+
+def get_cutoff(range_option, today):
+    if range_option == "Last 7 days":
+        return today - pd.Timedelta(days=7)
+    elif range_option == "Last month":
+        return today - pd.DateOffset(months=1)
+    elif range_option == "Last year":
+        return today - pd.DateOffset(years=1)
     else:
-        min_date = df['date'].min()
-        max_date = df['date'].max()
+        return None  # All time
 
-        # Optional: set fallback default if needed
-        if pd.isna(min_date) or pd.isna(max_date):
-            min_date = pd.Timestamp("2022-01-01")
-            max_date = pd.Timestamp("2022-12-31")
 
-    df_filtered = df.copy()
+def get_most_common_word(series):
+    # Flatten list of strings -> individual words
+    all_words = []
+    for entry in series.dropna():
+        if isinstance(entry, str):
+            words = [word.strip() for word in entry.split(',')
+                     ]  # or .split() if space-separated
+            all_words.extend(words)
+    return Counter(all_words).most_common(1)[0][0] if all_words else None
 
-    st.divider()
 
-    # --- Display metrics ---
-    st.subheader(f"📊 {period} Comparison")
+def compute_report(df, range_option, today=None):
+    # Everything the reports page shows for one time range, without rendering.
+    # Also used by batch_reports.py to precompute snapshots.
+    if today is None:
+        today = pd.Timestamp.today().normalize()
 
+    # --- Metrics ---
     # Average pain this week vs last week
     # Define current and previous week ranges
-    today = pd.Timestamp.today().normalize()
     if range_option == "Last 7 days":
         this_start = today - pd.Timedelta(days=6)
         last_start = this_start - pd.Timedelta(days=7)
@@ -106,88 +125,34 @@ def display_reports():
 
     # Most painful area this week compared to last week
     # Get the most painful area for this week and last week based on strings in bpi2
-    from collections import Counter
-
-    def get_most_common_word(series):
-        # Flatten list of strings -> individual words
-        all_words = []
-        for entry in series.dropna():
-            if isinstance(entry, str):
-                words = [word.strip() for word in entry.split(',')
-                         ]  # or .split() if space-separated
-                all_words.extend(words)
-        return Counter(all_words).most_common(1)[0][0] if all_words else None
-
-    # Process bpi2 text entries
-    this_areas = this_period_df["bpi2"]
-    last_areas = last_period_df["bpi2"]
-
-    most_common_this = get_most_common_word(this_areas)
-    most_common_last = get_most_common_word(last_areas)
+    most_common_this = get_most_common_word(this_period_df["bpi2"])
+    most_common_last = get_most_common_word(last_period_df["bpi2"])
 
     if most_common_this and most_common_last:
         area_delta = f"was {most_common_last}" if most_common_this != most_common_last else "No change"
     else:
         area_delta = "N/A"
 
-    # Display two metrics
-    col1, col2 = st.columns(2)
-    with col1:
-        st.metric(
-            label=f"Average Pain Score ({range_option})",
-            value=f"{mean_this_period:.2f}" if pd.notna(
-                mean_this_period) else "No data",
-            delta=f"{delta:+.2f}" if delta is not None else "N/A",
-            delta_color="inverse",
-            border=True
-        )
-    with col2:
-        st.metric(
-            label=f"Most Painful Area ({range_option})",
-            value=most_common_this if most_common_this else "No data",
-            delta=area_delta,
-            delta_color="off",
-            border=True
-        )
-
-        st.divider()
-
-    # --- Display pain over time ---
-    st.subheader(f"📈 {period} Trends")
-
-    # Define pain variables to plot (excluding bpi6)
-    pain_col_labels = {
-        "bpi3": "Worst",
-        "bpi4": "Least",
-        "bpi5": "Average"
-    }
+    # --- Pain over time ---
+    # df may be shared with other sessions (see storage.load_entries), so it is
+    # only read here; the frames below are built from the selected rows
     pain_cols = list(pain_col_labels.keys())
+    cutoff = get_cutoff(range_option, today)
 
-    today = pd.Timestamp.today().normalize()
+    df_range = df[df["date"] >= cutoff] if cutoff is not None else df
 
     if range_option == "Last 7 days":
-        cutoff = today - pd.Timedelta(days=7)
+        period = df_range["date"]
     elif range_option == "Last month":
-        cutoff = today - pd.DateOffset(months=1)
-    elif range_option == "Last year":
-        cutoff = today - pd.DateOffset(years=1)
-    else:
-        cutoff = None  # All time
-
-    df_chart = df_filtered[df_filtered["date"] >=
-                           cutoff] if cutoff is not None else df_filtered.copy()
+        period = df_range["date"].dt.to_period("W").dt.start_time
+    else:  # Last year or All time
+        period = df_range["date"].dt.to_period("M").dt.start_time
+    period = period.rename("period")
 
     if range_option == "Last 7 days":
-        df_chart["period"] = df_chart["date"]
-        agg_df = df_chart[["period"] + pain_cols].copy()
-    elif range_option == "Last month":
-        df_chart["period"] = df_chart["date"].dt.to_period(
-            "W").apply(lambda r: r.start_time)
-        agg_df = df_chart.groupby("period")[pain_cols].mean().reset_index()
-    else:  # Last year or All time
-        df_chart["period"] = df_chart["date"].dt.to_period(
-            "M").apply(lambda r: r.start_time)
-        agg_df = df_chart.groupby("period")[pain_cols].mean().reset_index()
+        agg_df = pd.concat([period, df_range[pain_cols]], axis=1)
+    else:
+        agg_df = df_range[pain_cols].groupby(period).mean().reset_index()
 
     # Melt after aggregation
     melted_df = agg_df.melt(
@@ -197,6 +162,42 @@ def display_reports():
     # Drop rows with missing values
     melted_df = melted_df.dropna(subset=["Score", "Pain Type"])
 
+    # --- Pain interference ---
+    # Compute mean interference scores
+    mean_scores = df_range[interference_vars].mean()
+
+    # Build a DataFrame with friendly names and corresponding mean scores
+    interference_df = pd.DataFrame({
+        "Factor": [labels[var] for var in interference_vars],
+        "Score": [mean_scores[var] for var in interference_vars]
+    })
+
+    # --- Treatment comparisons ---
+    # Replace missing bpi7 values with a label "None"
+    bpi7_clean = df_range["bpi7"].fillna("None").rename("bpi7_clean")
+
+    # Group by bpi7_clean and compute the mean bpi5
+    bpi7_mean = df_range["bpi5"].groupby(bpi7_clean, dropna=False).mean().reset_index()
+    bpi7_mean = bpi7_mean.rename(columns={"bpi5": "mean_bpi5"})
+
+    return {
+        "range_option": range_option,
+        "period": get_period(range_option),
+        "has_dates": not df["date"].dropna().empty,
+        "mean_this_period": mean_this_period if pd.notna(mean_this_period) else None,
+        "delta": delta,
+        "most_common_this": most_common_this,
+        "area_delta": area_delta,
+        "trend": melted_df,
+        "interference": interference_df,
+        "treatment": bpi7_mean,
+    }
+
+
+def build_charts(report):
+    # Returns (trend, interference, treatment) Altair charts for a report
+    range_option = report["range_option"]
+
     # Define color and dash styles
     color_scale = alt.Scale(domain=["Worst", "Least", "Average"],
                             range=["red", "green", "#1f77b4"])
@@ -204,7 +205,7 @@ def display_reports():
                            range=[[4, 4], [4, 4], [0]])
 
     # Create Altair chart
-    line_chart = alt.Chart(melted_df).mark_line(point=(range_option == "Last 7 days")).encode(
+    line_chart = alt.Chart(report["trend"]).mark_line(point=(range_option == "Last 7 days")).encode(
         x=alt.X("period:T", title="Date"),
         y=alt.Y("Score:Q", title="Score", scale=alt.Scale(domain=[0, 10])),
         color=alt.Color("Pain Type:N", title="Pain Type", scale=color_scale),
@@ -225,51 +226,8 @@ def display_reports():
         height=400
     )
 
-    st.altair_chart(line_chart, use_container_width=True)
-
-    st.divider()
-
-    # --- Display pain interference bar plot ---
-    st.subheader(f"{period} Pain Interference")
-
-    interference_vars = ["bpi9a", "bpi9b", "bpi9c",
-                         "bpi9d", "bpi9e", "bpi9f", "bpi9g"]
-
-    labels = {
-        "bpi9a": "General Activity",
-        "bpi9b": "Mood",
-        "bpi9c": "Walking",
-        "bpi9d": "Normal Work",
-        "bpi9e": "Relations",
-        "bpi9f": "Sleep",
-        "bpi9g": "Enjoyment of Life"
-    }
-
-    # Apply the same range_option filter
-    today = pd.Timestamp.today().normalize()
-    if range_option == "Last 7 days":
-        cutoff = today - pd.Timedelta(days=7)
-    elif range_option == "Last month":
-        cutoff = today - pd.DateOffset(months=1)
-    elif range_option == "Last year":
-        cutoff = today - pd.DateOffset(years=1)
-    else:
-        cutoff = None
-
-    df_interference = df_filtered[df_filtered["date"]
-                                  >= cutoff] if cutoff is not None else df_filtered
-
-    # Compute mean interference scores
-    mean_scores = df_interference[interference_vars].mean()
-
-    # Build a DataFrame with friendly names and corresponding mean scores
-    interference_df = pd.DataFrame({
-        "Factor": [labels[var] for var in interference_vars],
-        "Score": [mean_scores[var] for var in interference_vars]
-    })
-
     # Create a horizontal bar chart
-    interference_bar_chart = alt.Chart(interference_df).mark_bar().encode(
+    interference_bar_chart = alt.Chart(report["interference"]).mark_bar().encode(
         y=alt.Y("Factor:N", title=""),
         x=alt.X("Score:Q", title="Average Score",
                 scale=alt.Scale(domain=[0, 10])),
@@ -295,27 +253,8 @@ def display_reports():
     # Layer the text on top of the bars
     interference_chart = interference_bar_chart + interference_text
 
-    st.altair_chart(interference_chart, use_container_width=True)
-
-    st.divider()
-
-    # --- Display Treatment Comparisons ---
-    st.subheader(f"💊 {period} Treatment Comparisons")
-
-    # Filter the DataFrame based on the cutoff (if provided)
-    df_bpi7 = df_filtered[df_filtered["date"] >=
-                          cutoff] if cutoff is not None else df_filtered.copy()
-
-    # Replace missing bpi7 values with a label "None"
-    df_bpi7["bpi7_clean"] = df_bpi7["bpi7"].fillna("None")
-
-    # Group by bpi7_clean and compute the mean bpi5
-    bpi7_mean = df_bpi7.groupby("bpi7_clean", dropna=False)[
-        "bpi5"].mean().reset_index()
-    bpi7_mean = bpi7_mean.rename(columns={"bpi5": "mean_bpi5"})
-
     # Create Altair bar plot
-    bar_chart = alt.Chart(bpi7_mean).mark_bar().encode(
+    bar_chart = alt.Chart(report["treatment"]).mark_bar().encode(
         y=alt.Y("bpi7_clean:N", title=""),
         x=alt.X("mean_bpi5:Q", title="Average Pain Score",
                 scale=alt.Scale(domain=[0, 10])),
@@ -340,12 +279,193 @@ def display_reports():
 
     treatment_chart = (bar_chart + text_for_bar_chart)
 
+    return line_chart, interference_chart, treatment_chart
+
+
+def build_heatmap(arrays, column):
+    # One GitHub-style calendar per year, newest first. Each year is a fixed
+    # 7 x 54 grid taken straight from one snapshot of the daily arrays.
+    years = daily_values.years(arrays)[::-1]
+    fig = make_subplots(rows=len(years), cols=1, subplot_titles=[str(y) for y in years],
+                        vertical_spacing=0.3 / len(years))
+    for row, year in enumerate(years, start=1):
+        fig.add_trace(go.Heatmap(
+            z=daily_values.year_grid(arrays, column, year),
+            customdata=daily_values.year_dates(year),
+            x=list(range(1, 55)),
+            y=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+            zmin=0,
+            zmax=10,
+            colorscale=[[0, "#2ca02c"], [0.5, "#ffdd57"], [1, "red"]],
+            showscale=row == 1,
+            colorbar=dict(title="Score", len=min(1, 2 / len(years)), y=1, yanchor="top"),
+            xgap=2,
+            ygap=2,
+            hovertemplate="%{y} %{customdata}: %{z}<extra></extra>"
+        ), row=row, col=1)
+        fig.update_yaxes(autorange="reversed", row=row, col=1)
+    fig.update_xaxes(showticklabels=False)
+    fig.update_layout(height=60 + 180 * len(years), margin=dict(t=40, b=10))
+    return fig
+
+
+# --- Precomputed snapshots (written by batch_reports.py) ---
+
+def report_dir(csv_file):
+    return os.path.splitext(csv_file)[0] + "_reports"
+
+
+def source_fingerprint(csv_file):
+    # Any write to the log changes its size or modification time
+    stat = os.stat(csv_file)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def report_to_json(report):
+    data = {key: value for key, value in report.items()
+            if not isinstance(value, pd.DataFrame)}
+    for key in ("trend", "interference", "treatment"):
+        # "split" keeps the columns of empty frames
+        data[key] = json.loads(report[key].to_json(
+            orient="split", index=False, date_format="iso"))
+    return data
+
+
+def report_from_json(data):
+    report = dict(data)
+    for key in ("trend", "interference", "treatment"):
+        report[key] = pd.DataFrame(data[key]["data"], columns=data[key]["columns"])
+    # JSON has no dates and writes NaN as null; restore the computed dtypes,
+    # also for the empty frames of an empty log
+    report["trend"]["period"] = pd.to_datetime(report["trend"]["period"])
+    report["interference"]["Score"] = report["interference"]["Score"].astype(float)
+    report["treatment"]["mean_bpi5"] = report["treatment"]["mean_bpi5"].astype(float)
+    return report
+
+
+def load_report_snapshot(csv_file, range_option):
+    # Precomputed report, or None if the log changed or it is from another day
+    path = os.path.join(report_dir(csv_file), "snapshot.json")
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if (snapshot["source"] != source_fingerprint(csv_file)
+            or snapshot["generated"] != datetime.date.today().isoformat()):
+        return None
+    return report_from_json(snapshot["reports"][range_option])
+
+
+def display_reports():
+    st.title("Your Pain Report")
+
+    # Load CSV
+    csv_file = "pain_log.csv"
+
+    # Guard clause against missing file
+    if not os.path.exists(csv_file):
+        st.warning(
+            "⚠️ No data found. Please create an entry first.")
+        return
+
+    # Data frame for display - should be removed in the final version
+    # st.subheader(
+    #     "🗂 Logged Pain Data (I DON'T THINK THIS SHOULD BE AT THE TOP IN THE FINAL VERSION)")
+    # st.dataframe(df, use_container_width=True)
+
+    # Choose time range
+    range_option = st.radio(
+        "**Select time range**",
+        RANGE_OPTIONS,
+        horizontal=True
+    )
+
+    # Serve the batch snapshot if it is still fresh, otherwise compute live
+    report = load_report_snapshot(csv_file, range_option)
+    if report is None:
+        # Compacted snapshot + new rows, already sorted by date. Use the shared
+        # memory-mapped copy when a loader process publishes one
+        df = shared_dataset.load_entries(csv_file)
+        if df is None:
+            df = load_entries(csv_file)
+        report = compute_report(df, range_option)
+
+    period = report["period"]
+
+    # Date filter
+    if not report["has_dates"]:
+        st.warning("No valid dates available in the data.")
+
+    st.divider()
+
+    # --- Display metrics ---
+    st.subheader(f"📊 {period} Comparison")
+
+    mean_this_period = report["mean_this_period"]
+    delta = report["delta"]
+    most_common_this = report["most_common_this"]
+
+    # Display two metrics
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric(
+            label=f"Average Pain Score ({range_option})",
+            value=f"{mean_this_period:.2f}" if mean_this_period is not None else "No data",
+            delta=f"{delta:+.2f}" if delta is not None else "N/A",
+            delta_color="inverse",
+            border=True
+        )
+    with col2:
+        st.metric(
+            label=f"Most Painful Area ({range_option})",
+            value=most_common_this if most_common_this else "No data",
+            delta=report["area_delta"],
+            delta_color="off",
+            border=True
+        )
+
+        st.divider()
+
+    line_chart, interference_chart, treatment_chart = build_charts(report)
+
+    # --- Display pain over time ---
+    st.subheader(f"📈 {period} Trends")
+
+    st.altair_chart(line_chart, use_container_width=True)
+
+    st.divider()
+
+    # --- Display year-at-a-glance calendar ---
+    st.subheader("🗓️ Pain Calendar")
+
+    heatmap_column = st.selectbox(
+        "Show",
+        list(heatmap_labels.keys()),
+        index=2,  # bpi5, average pain
+        format_func=heatmap_labels.get
+    )
+    arrays = daily_values.get_daily_arrays(csv_file)
+    st.plotly_chart(build_heatmap(arrays, heatmap_column), use_container_width=True)
+
+    st.divider()
+
+    # --- Display pain interference bar plot ---
+    st.subheader(f"{period} Pain Interference")
+
+    st.altair_chart(interference_chart, use_container_width=True)
+
+    st.divider()
+
+    # --- Display Treatment Comparisons ---
+    st.subheader(f"💊 {period} Treatment Comparisons")
+
     st.altair_chart(treatment_chart, use_container_width=True)
 
     treatment_expander = st.expander("How to interpret treatment comparisons")
     treatment_expander.write("""
         This chart shows the average pain on days you used a treatment. It does *not* mean that the treatment causes more or less pain.
-        
+
         For example, if you only take painkillers when your pain is high, the chart may show high pain on those days. This just means that you take painkillers only on bad days, not that they cause more pain.
     """)
 
@@ -0,0 +1,243 @@
+import argparse
+import datetime
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+import pyarrow as pa
+import storage
+from storage import (PAIN_LOG, SCORE_FIELDS, append_entries, merge_tail,
+                     read_log_tail)
+
+
+# Shared, read-only pain log for several Streamlit server processes.
+#
+#   python shared_dataset.py publish --watch     # one loader process
+#   python shared_dataset.py bench --workers 4   # RSS per worker incl. the page
+#
+# The loader writes the sorted entries as an Arrow IPC file per generation and
+# then points CURRENT at it. Workers memory-map the current generation, so the
+# pages are shared through the OS page cache instead of being parsed into a
+# private frame in every process. A worker switches to a new generation the
+# next time it loads after CURRENT changes. Rows appended after the published
+# generation are read from the log tail, as in storage.load_entries.
+
+DATASET_SUFFIX = "_shared"
+POINTER = "CURRENT"
+KEEP_GENERATIONS = 2
+
+# Per-process view of each log's current generation, with the log tail merged
+# in: {filename: {"generation", "log_offset", "log_size", "df"}}
+current = {}
+current_lock = threading.Lock()
+
+
+def dataset_dir(filename=PAIN_LOG):
+    return os.path.splitext(filename)[0] + DATASET_SUFFIX
+
+
+def read_pointer(filename=PAIN_LOG):
+    # Returns (generation, log_offset) or None if nothing is published yet
+    path = os.path.join(dataset_dir(filename), POINTER)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        generation, log_offset = f.read().split()
+    return int(generation), int(log_offset)
+
+
+def publish(filename=PAIN_LOG):
+    # Write a new generation if the log has changed; returns the generation
+    folder = dataset_dir(filename)
+    os.makedirs(folder, exist_ok=True)
+    pointer = read_pointer(filename)
+
+    df, log_offset = storage.load_entries_with_offset(filename)
+    if pointer and pointer[1] == log_offset:
+        return pointer[0]
+
+    generation = pointer[0] + 1 if pointer else 1
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    path = os.path.join(folder, f"gen-{generation:06d}.arrow")
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+
+    # Atomic switch for the workers
+    tmp = os.path.join(folder, POINTER + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(f"{generation} {log_offset}")
+    os.replace(tmp, os.path.join(folder, POINTER))
+
+    # Unlinking a file that a worker still maps is safe; the mapping stays valid
+    old = sorted(name for name in os.listdir(folder) if name.endswith(".arrow"))
+    for name in old[:-KEEP_GENERATIONS]:
+        os.remove(os.path.join(folder, name))
+    return generation
+
+
+def map_generation(filename, generation):
+    path = os.path.join(dataset_dir(filename), f"gen-{generation:06d}.arrow")
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    # split_blocks keeps numeric and date columns as views on the mapped buffers
+    return table.to_pandas(split_blocks=True)
+
+
+def load_entries(filename=PAIN_LOG):
+    # Drop-in for storage.load_entries backed by the shared dataset
+    loaded = load_entries_with_offset(filename)
+    return None if loaded is None else loaded[0]
+
+
+def load_entries_with_offset(filename=PAIN_LOG):
+    # (entries, log offset they cover), or None if nothing is published yet
+    pointer = read_pointer(filename)
+    if pointer is None:
+        return None
+
+    generation, log_offset = pointer
+    log_size = os.path.getsize(filename)
+    with current_lock:
+        view = current.get(filename)
+        if view is None or view["generation"] != generation:
+            try:
+                df = map_generation(filename, generation)
+            except FileNotFoundError:
+                return None
+            view = {"generation": generation, "log_offset": log_offset,
+                    "log_size": None, "df": df}
+        if view["log_size"] != log_size:
+            # Merge only the rows appended since the last call; without a
+            # tail this is the mapped frame itself
+            tail, end = read_log_tail(filename, view["log_offset"])
+            view = {"generation": generation, "log_offset": end,
+                    "log_size": log_size, "df": merge_tail(view["df"], tail)}
+        current[filename] = view
+        # Read-only, shared with every session in this process
+        return view["df"], view["log_offset"]
+
+
+def watch(filename, interval):
+    last_size = None
+    while True:
+        size = os.path.getsize(filename)
+        if size != last_size:
+            started = time.perf_counter()
+            generation = publish(filename)
+            print(f"Published generation {generation} "
+                  f"in {time.perf_counter() - started:.2f}s")
+            last_size = size
+        time.sleep(interval)
+
+
+# --- RSS benchmark ---
+
+def rss_mb(pid="self"):
+    # Proportional set size counts shared pages once across processes;
+    # fall back to plain RSS where smaps_rollup is not available
+    for path, key in ((f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")):
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(key):
+                        return int(line.split()[1]) / 1024
+    if pid != "self":
+        return float("nan")
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_worker(filename, shared, ready, done, results):
+    # Imported before measuring so only the data and the page are counted
+    import daily_values
+    from report import RANGE_OPTIONS, build_heatmap, compute_report
+    # Forked after publish(): start without the frames cached in the parent
+    storage.entries_cache.clear()
+    current.clear()
+    daily_values.cache.clear()
+    before = rss_mb()
+    if shared:
+        df = load_entries(filename)
+    else:
+        df = storage.load_entries(filename)
+    loaded = rss_mb()
+    # Everything the reports page computes from the data: the reports for
+    # every range and the pain calendar with its daily arrays
+    reports = [compute_report(df, range_option) for range_option in RANGE_OPTIONS]
+    heatmap = build_heatmap(daily_values.get_daily_arrays(filename), "bpi5")
+    results.put((loaded - before, rss_mb() - before, len(df)))
+    del reports, heatmap
+    ready.wait()
+    done.wait()
+
+
+def run_workers(filename, workers, shared):
+    ctx = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+    ready = ctx.Barrier(workers + 1)
+    done = ctx.Event()
+    results = ctx.Queue()
+    procs = [ctx.Process(target=bench_worker, args=(filename, shared, ready, done, results))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    # Measure while all workers still hold their frames
+    ready.wait()
+    deltas = [results.get() for _ in procs]
+    done.set()
+    for p in procs:
+        p.join()
+    return deltas
+
+
+def bench(rows, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "pain_log.csv")
+        start = datetime.date.today() - datetime.timedelta(days=rows)
+        append_entries([
+            {"date": start + datetime.timedelta(days=i), "bpi1": "Yes",
+             "bpi2": "Neck, Back", "bpi7": random.choice(["Yoga", "Painkillers", ""]),
+             **{c: random.randint(0, 10) for c in SCORE_FIELDS},
+             "bpi8": random.randrange(0, 101, 10)}
+            for i in range(rows)
+        ], filename)
+        publish(filename)
+
+        for label, shared in (("Per-worker CSV parse", False), ("Shared Arrow mmap", True)):
+            deltas = run_workers(filename, workers, shared)
+            loaded = sum(d for d, _, _ in deltas) / workers
+            per_worker = [d for _, d, _ in deltas]
+            print(f"{label:22s} {workers} workers x {deltas[0][2]:,} rows: "
+                  f"{loaded:7.1f} MB/worker loaded, "
+                  f"{sum(per_worker) / workers:7.1f} MB/worker with the page, "
+                  f"{sum(per_worker):7.1f} MB total")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared memory-mapped pain log")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    publish_parser = sub.add_parser("publish", help="publish the current log")
+    publish_parser.add_argument("--file", default=PAIN_LOG)
+    publish_parser.add_argument("--watch", action="store_true",
+                                help="keep publishing after writes")
+    publish_parser.add_argument("--interval", type=float, default=2.0)
+
+    bench_parser = sub.add_parser("bench", help="compare per-worker memory")
+    bench_parser.add_argument("--rows", type=int, default=40000)
+    bench_parser.add_argument("--workers", type=int, default=4)
+
+    args = parser.parse_args()
+    if args.command == "publish":
+        try:
+            if args.watch:
+                watch(args.file, args.interval)
+            else:
+                print(f"Published generation {publish(args.file)}")
+        except KeyboardInterrupt:
+            pass
+    else:
+        bench(args.rows, args.workers)
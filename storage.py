@@ -0,0 +1,245 @@
+import io
+import json
+import os
+import re
+import threading
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Shared pain log used by the entry form, the reports page and the ingestion API
+PAIN_LOG = "pain_log.csv"
+SEPARATOR = ";"
+DATE_FORMAT = "%d-%m-%Y"
+
+COLUMNS = [
+    "date", "bpi1", "bpi2", "bpi3", "bpi4", "bpi5", "bpi6", "bpi7", "bpi8",
+    "bpi9a", "bpi9b", "bpi9c", "bpi9d", "bpi9e", "bpi9f", "bpi9g"
+]
+
+# 0-10 ratings: pain severity (bpi3-bpi6) and interference (bpi9a-bpi9g)
+SCORE_FIELDS = [
+    "bpi3", "bpi4", "bpi5", "bpi6",
+    "bpi9a", "bpi9b", "bpi9c", "bpi9d", "bpi9e", "bpi9f", "bpi9g"
+]
+
+
+def extract_number(value):
+    # "🟠 5", "60 %" and "✅ 0 - No pain" all map to the number they show
+    if isinstance(value, str):
+        match = re.search(r'\d+', value)
+        if match:
+            return int(match.group())
+    return value
+
+
+def append_entries(rows: list, filename=PAIN_LOG):
+    # Append one or more entries in the same layout as the existing log
+    if not rows:
+        return
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["date"] = pd.to_datetime(df["date"]).dt.strftime(DATE_FORMAT)
+    # Also for a log that exists but is empty, e.g. created ahead of time
+    header = not os.path.exists(filename) or os.path.getsize(filename) == 0
+    data = df.to_csv(sep=SEPARATOR, header=header, index=False)
+    with open(filename, "a", newline="") as f:
+        start = f.tell()
+        try:
+            f.write(data)
+            f.flush()
+        except OSError:
+            # Don't leave half a row behind for the next append to run into
+            f.truncate(start)
+            raise
+
+
+# --- Snapshots ---
+#
+# compact() folds the rows appended to the log into sorted, de-duplicated
+# Parquet segments (one per year) and records them in a manifest together
+# with the byte offset of the log it has consumed. Readers load the segments
+# named by the manifest plus the tail of the log after that offset, so they
+# always see one consistent snapshot plus a small tail. Each process keeps the
+# merged result per log and only re-reads segments when the generation changes.
+
+SNAPSHOT_SUFFIX = "_snapshots"
+MANIFEST = "manifest.json"
+SEGMENT_SUFFIX = ".parquet"
+
+# Per-log merged entries: {filename: {"generation", "log_offset", "log_size", "df"}}
+entries_cache = {}
+entries_cache_lock = threading.Lock()
+
+
+def snapshot_dir(filename=PAIN_LOG):
+    return os.path.splitext(filename)[0] + SNAPSHOT_SUFFIX
+
+
+def read_manifest(filename=PAIN_LOG):
+    path = os.path.join(snapshot_dir(filename), MANIFEST)
+    if not os.path.exists(path):
+        return {"generation": 0, "log_offset": 0, "segments": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_dates(df: pd.DataFrame):
+    df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors='coerce')
+    return df
+
+
+def read_log_tail(filename, offset):
+    # Returns (rows after offset, offset of the last complete line)
+    with open(filename, "rb") as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    tail = pd.read_csv(io.BytesIO(header + data[:end]), sep=SEPARATOR)
+    return parse_dates(tail), max(offset, len(header)) + end
+
+
+def dedupe_sorted(df: pd.DataFrame):
+    # Latest submission for a date wins
+    df = df.dropna(subset=["date"])
+    df = df.drop_duplicates(subset="date", keep="last")
+    return df.sort_values("date", kind="stable")
+
+
+def load_snapshot(manifest, filename=PAIN_LOG):
+    folder = snapshot_dir(filename)
+    frames = [pd.read_parquet(os.path.join(folder, name))
+              for _, name in sorted(manifest["segments"].items())]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS).astype({"date": "datetime64[ns]"})
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_entries(filename=PAIN_LOG):
+    # Sorted, de-duplicated entries: compacted snapshot + uncompacted tail.
+    # The frame is shared with other callers in the process; don't modify it.
+    return load_entries_with_offset(filename)[0]
+
+
+def load_entries_with_offset(filename=PAIN_LOG):
+    # Like load_entries, plus the log offset the result covers, so callers can
+    # later pick up only the rows appended after it
+    with entries_cache_lock:
+        cached = entries_cache.get(filename)
+        manifest = read_manifest(filename)
+        log_size = os.path.getsize(filename)
+        if cached is not None and cached["generation"] == manifest["generation"]:
+            if cached["log_size"] == log_size:
+                return cached["df"], cached["log_offset"]
+            # Only the rows appended since the last call are read
+            df, offset = cached["df"], cached["log_offset"]
+        else:
+            manifest, df = read_snapshot(filename)
+            offset = manifest["log_offset"]
+
+        tail, end = read_log_tail(filename, offset)
+        df = merge_tail(df, tail)
+        entries_cache[filename] = {"generation": manifest["generation"], "log_offset": end,
+                                   "log_size": log_size, "df": df}
+        return df, end
+
+
+def read_entries_with_offset(filename=PAIN_LOG):
+    # Same result as load_entries_with_offset, but not kept in the cache, for
+    # callers that only derive something smaller from it
+    manifest, snapshot = read_snapshot(filename)
+    tail, end = read_log_tail(filename, manifest["log_offset"])
+    return merge_tail(snapshot, tail), end
+
+
+def read_snapshot(filename=PAIN_LOG):
+    # Returns (manifest, snapshot) for the current generation
+    for attempt in range(3):
+        manifest = read_manifest(filename)
+        try:
+            return manifest, load_snapshot(manifest, filename)
+        except FileNotFoundError:
+            # Compaction swapped the manifest and removed an old segment
+            # between our reads; pick up the new generation
+            if attempt == 2:
+                raise
+
+
+def merge_tail(snapshot: pd.DataFrame, tail: pd.DataFrame):
+    # Overlay new rows on a sorted snapshot without re-sorting all of it
+    if tail.empty:
+        return snapshot
+
+    tail = dedupe_sorted(tail)
+    if snapshot.empty:
+        return tail.reset_index(drop=True)
+    snapshot = snapshot[~snapshot["date"].isin(tail["date"])]
+    if snapshot.empty or tail["date"].min() > snapshot["date"].max():
+        # Usual case: new entries are newer than everything compacted
+        df = pd.concat([snapshot, tail], ignore_index=True)
+    else:
+        df = pd.concat([snapshot, tail], ignore_index=True).sort_values("date", kind="stable")
+    return df.reset_index(drop=True)
+
+
+def try_lock(lock_file):
+    # Non-blocking exclusive lock; the OS drops it when the process dies
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def compact(filename=PAIN_LOG):
+    # Merge the log tail into the snapshot; returns the number of rows folded
+    # in, or None if another process is compacting right now
+    folder = snapshot_dir(filename)
+    os.makedirs(folder, exist_ok=True)
+    lock_file = open(os.path.join(folder, "compact.lock"), "a+")
+    if not try_lock(lock_file):
+        lock_file.close()
+        return None
+    try:
+        manifest = read_manifest(filename)
+        tail, end = read_log_tail(filename, manifest["log_offset"])
+        if end == manifest["log_offset"]:
+            return 0
+
+        generation = manifest["generation"] + 1
+        segments = dict(manifest["segments"])
+        tail = tail.dropna(subset=["date"])
+        for year, rows in tail.groupby(tail["date"].dt.year):
+            year = str(year)
+            if year in segments:
+                old = pd.read_parquet(os.path.join(folder, segments[year]))
+                rows = pd.concat([old, rows], ignore_index=True)
+            name = f"{year}.g{generation}{SEGMENT_SUFFIX}"
+            dedupe_sorted(rows).reset_index(drop=True).to_parquet(
+                os.path.join(folder, name), compression="zstd", index=False)
+            segments[year] = name
+
+        # Atomic swap: readers see either the old or the new manifest
+        new_manifest = {"generation": generation, "log_offset": end, "segments": segments}
+        tmp = os.path.join(folder, MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(new_manifest, f, indent=2)
+        os.replace(tmp, os.path.join(folder, MANIFEST))
+
+        # Keep the previous generation's segments for readers still loading it
+        keep = set(segments.values()) | set(manifest["segments"].values())
+        for name in os.listdir(folder):
+            if name.endswith(SEGMENT_SUFFIX) and name not in keep:
+                os.remove(os.path.join(folder, name))
+        return len(tail)
+    finally:
+        # Closing releases the lock; the file itself stays for the next run
+        lock_file.close()
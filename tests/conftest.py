@@ -0,0 +1,36 @@
+import datetime
+import os
+import sys
+import pytest
+
+# The app is a set of top-level modules run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import daily_values  # noqa: E402
+import shared_dataset  # noqa: E402
+import storage  # noqa: E402
+from storage import SCORE_FIELDS  # noqa: E402
+
+
+def entry(day, score=5):
+    # Log row for the given date, or for that many days after 2024-01-01,
+    # with every 0-10 score set to score
+    if not isinstance(day, datetime.date):
+        day = datetime.date(2024, 1, 1) + datetime.timedelta(days=day)
+    row = {"date": day, "bpi1": "Yes", "bpi2": "Back", "bpi7": "", "bpi8": 10}
+    row.update({field: score for field in SCORE_FIELDS})
+    return row
+
+
+def clear_caches():
+    daily_values.cache.clear()
+    storage.entries_cache.clear()
+    shared_dataset.current.clear()
+
+
+@pytest.fixture
+def log(tmp_path):
+    # Path of an empty pain log in a fresh directory, with no cached state
+    clear_caches()
+    yield str(tmp_path / "pain_log.csv")
+    clear_caches()
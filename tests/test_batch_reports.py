@@ -0,0 +1,68 @@
+import datetime
+import json
+import os
+import pandas as pd
+from batch_reports import generate_reports, slug
+from conftest import entry
+from report import (RANGE_OPTIONS, compute_report, load_report_snapshot,
+                    report_dir, report_to_json)
+from storage import append_entries, load_entries
+
+
+def recent_entries(days):
+    today = datetime.date.today()
+    return [entry(today - datetime.timedelta(days=days - i), score=i % 11) for i in range(days)]
+
+
+def test_generate_reports_matches_compute_report(log):
+    append_entries(recent_entries(400), log)
+    generate_reports(log)
+
+    folder = report_dir(log)
+    with open(os.path.join(folder, "snapshot.json")) as f:
+        snapshot = json.load(f)
+    assert snapshot["generated"] == datetime.date.today().isoformat()
+
+    df = load_entries(log)
+    today = pd.Timestamp.today().normalize()
+    for range_option in RANGE_OPTIONS:
+        expected = report_to_json(compute_report(df, range_option, today))
+        assert snapshot["reports"][range_option] == expected
+        assert os.path.exists(os.path.join(folder, f"{slug(range_option)}.html"))
+        with open(os.path.join(folder, f"{slug(range_option)}.vl.json")) as f:
+            assert len(json.load(f)) == 3
+
+
+def test_snapshot_served_while_fresh(log):
+    append_entries(recent_entries(30), log)
+    generate_reports(log)
+
+    report = load_report_snapshot(log, "Last month")
+    live = compute_report(load_entries(log), "Last month", pd.Timestamp.today().normalize())
+    for key in ("trend", "interference", "treatment"):
+        pd.testing.assert_frame_equal(report[key], live[key].reset_index(drop=True))
+    assert report["mean_this_period"] == live["mean_this_period"]
+
+
+def test_snapshot_stale_after_append(log):
+    append_entries(recent_entries(30), log)
+    generate_reports(log)
+    append_entries([entry(datetime.date.today(), score=3)], log)
+    assert load_report_snapshot(log, "Last 7 days") is None
+
+
+def test_snapshot_stale_on_another_day(log):
+    append_entries(recent_entries(30), log)
+    generate_reports(log)
+    path = os.path.join(report_dir(log), "snapshot.json")
+    with open(path) as f:
+        snapshot = json.load(f)
+    snapshot["generated"] = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    with open(path, "w") as f:
+        json.dump(snapshot, f)
+    assert load_report_snapshot(log, "Last 7 days") is None
+
+
+def test_no_snapshot(log):
+    append_entries(recent_entries(3), log)
+    assert load_report_snapshot(log, "All time") is None
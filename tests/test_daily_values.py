@@ -0,0 +1,98 @@
+import datetime
+import numpy as np
+import shared_dataset
+import storage
+from daily_values import MISSING, get_daily_arrays, year_dates, year_grid, years
+from conftest import entry
+from report import build_heatmap
+from storage import append_entries, compact
+
+
+def score_on(arrays, date):
+    offset = int((np.datetime64(date, "D") - arrays["start"]).astype(int))
+    return int(arrays["values"]["bpi5"][offset])
+
+
+def test_arrays_follow_the_log(log):
+    append_entries([entry(datetime.date(2024, 3, 1), 4), entry(datetime.date(2024, 3, 3), 6)], log)
+    compact(log)
+    append_entries([entry(datetime.date(2024, 3, 1), 9)], log)
+
+    arrays = get_daily_arrays(log)
+    assert arrays["start"] == np.datetime64("2024-01-01")
+    assert score_on(arrays, "2024-03-01") == 9
+    assert score_on(arrays, "2024-03-02") == MISSING
+    assert score_on(arrays, "2024-03-03") == 6
+    assert len(arrays["values"]["bpi5"]) == (datetime.date.today() - datetime.date(2024, 1, 1)).days + 1
+    assert get_daily_arrays(log) is arrays
+
+
+def test_arrays_do_not_keep_a_private_frame(log):
+    append_entries([entry(datetime.date(2024, 3, 1), 4)], log)
+    get_daily_arrays(log)
+    assert storage.entries_cache == {}
+
+
+def test_arrays_built_from_published_dataset(log):
+    append_entries([entry(datetime.date(2024, 3, 1), 4)], log)
+    shared_dataset.publish(log)
+    storage.entries_cache.clear()
+    append_entries([entry(datetime.date(2024, 3, 2), 6)], log)
+
+    arrays = get_daily_arrays(log)
+    assert storage.entries_cache == {}
+    assert log in shared_dataset.current
+    assert score_on(arrays, "2024-03-01") == 4
+    assert score_on(arrays, "2024-03-02") == 6
+
+
+def test_snapshots_are_not_modified_by_later_rows(log):
+    append_entries([entry(datetime.date(2024, 3, 1), 4)], log)
+    first = get_daily_arrays(log)
+    first_values = {column: values.copy() for column, values in first["values"].items()}
+
+    # Same range: written into copies
+    append_entries([entry(datetime.date(2024, 3, 1), 8)], log)
+    second = get_daily_arrays(log)
+    assert score_on(second, "2024-03-01") == 8
+
+    # Older than the start: the arrays grow back to Jan 1 of that year
+    append_entries([entry(datetime.date(2022, 12, 30), 2)], log)
+    third = get_daily_arrays(log)
+    assert third["start"] == np.datetime64("2022-01-01")
+    assert score_on(third, "2022-12-30") == 2
+    assert score_on(third, "2024-03-01") == 8
+    assert years(third)[0] == 2022
+
+    assert first["start"] == np.datetime64("2024-01-01")
+    assert score_on(second, "2024-03-01") == 8
+    for column, values in first["values"].items():
+        assert np.array_equal(values, first_values[column])
+
+
+def test_partial_line_is_applied_once_complete(log):
+    append_entries([entry(datetime.date(2024, 3, 1), 4)], log)
+    get_daily_arrays(log)
+    with open(log, "a") as f:
+        f.write("02-03-2024;Yes;Back;5;5;5")
+    assert score_on(get_daily_arrays(log), "2024-03-02") == MISSING
+    with open(log, "a") as f:
+        f.write(";5;;10;5;5;5;5;5;5;5\n")
+    assert score_on(get_daily_arrays(log), "2024-03-02") == 5
+
+
+def test_year_grid_lines_up_with_dates(log):
+    append_entries([entry(datetime.date(2024, 1, 1), 3), entry(datetime.date(2024, 12, 31), 7)], log)
+    arrays = get_daily_arrays(log)
+    grid, dates = year_grid(arrays, "bpi5", 2024), year_dates(2024)
+    assert grid.shape == dates.shape == (7, 54)
+    # 2024-01-01 was a Monday, 2024-12-31 a Tuesday
+    assert (grid[0, 0], dates[0, 0]) == (3, "2024-01-01")
+    assert (grid[1, 52], dates[1, 52]) == (7, "2024-12-31")
+    assert np.isnan(grid).sum() == 7 * 54 - 2
+    assert (dates != "").sum() == 366
+
+    fig = build_heatmap(arrays, "bpi5")
+    trace = fig.data[-1]
+    assert "%{customdata}" in trace.hovertemplate
+    assert trace.customdata[0][0] == "2024-01-01"
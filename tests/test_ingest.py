@@ -0,0 +1,146 @@
+import asyncio
+import datetime
+import json
+import os
+import pytest
+import ingest
+from ingest import handle_request, validate_entry, writer_loop
+from storage import SCORE_FIELDS, load_entries
+
+
+def payload(**fields):
+    entry = {"date": "2024-01-01", "bpi1": "Yes", "bpi2": "Back", "bpi7": "Yoga", "bpi8": 40}
+    entry.update({field: 5 for field in SCORE_FIELDS})
+    entry.update(fields)
+    return entry
+
+
+def test_valid_entry():
+    row, errors = validate_entry(payload(bpi5="7", bpi8="60 %"))
+    assert errors == []
+    assert row["date"] == datetime.date(2024, 1, 1)
+    assert (row["bpi5"], row["bpi8"]) == (7, 60)
+
+
+def test_no_pain_report_defaults_to_zero():
+    row, errors = validate_entry({"date": "2024-01-01", "bpi1": "No"})
+    assert errors == []
+    assert all(row[field] == 0 for field in SCORE_FIELDS + ["bpi8"])
+    assert (row["bpi2"], row["bpi7"]) == ("", "")
+
+
+@pytest.mark.parametrize("fields, error", [
+    ({"bpi5": "-3"}, "bpi5: expected an integer from 0 to 10"),
+    ({"bpi5": "7.9"}, "bpi5: expected an integer from 0 to 10"),
+    ({"bpi5": "🟠 5"}, "bpi5: expected an integer from 0 to 10"),
+    ({"bpi5": 11}, "bpi5: expected an integer from 0 to 10"),
+    ({"bpi5": True}, "bpi5: expected an integer from 0 to 10"),
+    ({"bpi8": 101}, "bpi8: expected an integer from 0 to 100"),
+    ({"bpi1": "No"}, "bpi3: must be 0 when bpi1 is 'No'"),
+    ({"bpi1": "maybe"}, "bpi1: expected 'Yes' or 'No'"),
+    ({"date": "01-01-2024"}, "date: expected YYYY-MM-DD"),
+    ({"date": (datetime.date.today() + datetime.timedelta(days=1)).isoformat()},
+     "date: must not be in the future"),
+    ({"mood": 3}, "unknown fields: mood"),
+    ({"bpi2": 5}, "bpi2: expected a string"),
+    ({"bpi7": "x" * 101}, "bpi7: at most 100 characters"),
+    ({"bpi7": "Yoga\n01-01-2024;No"}, "bpi7: must not contain control characters"),
+    ({"bpi2": "Back\x7f"}, "bpi2: must not contain control characters"),
+])
+def test_invalid_entry(fields, error):
+    row, errors = validate_entry(payload(**fields))
+    assert row is None
+    assert error in errors
+
+
+def test_text_at_the_limit_is_accepted():
+    row, errors = validate_entry(payload(bpi7="x" * 100))
+    assert errors == []
+
+
+def request(method, path, body=b"", ok=True):
+    async def run():
+        queue = asyncio.Queue()
+        health = {"ok": ok, "error": None if ok else "disk full"}
+        status, response = await handle_request(method, path, body, queue, health)
+        return status, response, queue
+    return asyncio.run(run())
+
+
+def test_post_queues_entries():
+    status, response, queue = request("POST", "/entries", json.dumps([payload(), payload()]).encode())
+    assert (status, response) == (202, {"accepted": 2})
+    assert len(queue.get_nowait()) == 2
+
+
+@pytest.mark.parametrize("method, path, body, status", [
+    ("POST", "/entries", b"{not json", 400),
+    ("POST", "/entries", b"[]", 400),
+    ("POST", "/entries", json.dumps([payload(), payload(bpi5=-1)]).encode(), 400),
+    ("GET", "/entries", b"", 405),
+    ("POST", "/elsewhere", b"", 404),
+    ("POST", "/entries", json.dumps([payload()] * 1001).encode(), 413),
+])
+def test_request_errors(method, path, body, status):
+    assert request(method, path, body)[0] == status
+
+
+def test_unhealthy_log_answers_503():
+    assert request("GET", "/health", ok=False)[:2] == (
+        503, {"status": "unhealthy", "error": "disk full", "queued_requests": 0})
+    status, _, queue = request("POST", "/entries", json.dumps(payload()).encode(), ok=False)
+    assert status == 503
+    assert queue.empty()
+    assert request("GET", "/health")[0] == 200
+
+
+def run_writer(log, rows, failures, monkeypatch, cancel_after=None):
+    # Runs writer_loop on one batch with append_entries failing `failures` times
+    calls = []
+    append = ingest.append_entries
+
+    def flaky_append(batch, filename):
+        calls.append(len(batch))
+        if len(calls) <= failures:
+            raise OSError("disk full")
+        append(batch, filename)
+
+    monkeypatch.setattr(ingest, "append_entries", flaky_append)
+    monkeypatch.setattr(ingest, "RETRY_DELAY", 0.001)
+
+    async def run():
+        queue = asyncio.Queue()
+        health = {"ok": True, "error": None}
+        task = asyncio.create_task(writer_loop(queue, health, log))
+        queue.put_nowait(rows)
+        if cancel_after is None:
+            await queue.join()
+        else:
+            await asyncio.sleep(cancel_after)
+        states = dict(health)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return states
+    return asyncio.run(run()), calls
+
+
+def test_writer_retries_failed_appends(log, monkeypatch):
+    rows = [validate_entry(payload(date=f"2024-01-0{day}"))[0] for day in (1, 2)]
+    health, calls = run_writer(log, rows, failures=3, monkeypatch=monkeypatch)
+    assert calls == [2, 2, 2, 2]
+    assert health == {"ok": True, "error": None}
+    assert len(load_entries(log)) == 2
+    assert not os.path.exists(log + ".deadletter.jsonl")
+
+
+def test_writer_spills_unwritten_rows_on_shutdown(log, monkeypatch):
+    rows = [validate_entry(payload())[0]]
+    health, calls = run_writer(log, rows, failures=10 ** 6, monkeypatch=monkeypatch,
+                               cancel_after=0.05)
+    assert len(calls) > 1
+    assert health == {"ok": False, "error": "disk full"}
+    assert not os.path.exists(log)
+    with open(log + ".deadletter.jsonl") as f:
+        spilled = [json.loads(line) for line in f]
+    assert spilled == [{**rows[0], "date": "2024-01-01"}]
@@ -0,0 +1,69 @@
+import json
+import pandas as pd
+import pytest
+from report import RANGE_OPTIONS, compute_report, report_from_json, report_to_json
+from storage import SCORE_FIELDS
+
+TODAY = pd.Timestamp("2024-06-30")
+
+
+def entries(days):
+    dates = pd.date_range(end=TODAY, periods=days)
+    df = pd.DataFrame({"date": dates, "bpi1": "Yes", "bpi2": "Neck, Back",
+                       "bpi7": ["Yoga", None, "Walk"] * (days // 3), "bpi8": 10})
+    for i, field in enumerate(SCORE_FIELDS):
+        df[field] = (pd.Series(range(days)) + i) % 11
+    return df
+
+
+def test_compute_report_leaves_input_alone():
+    df = entries(600)
+    before = df.copy()
+    for range_option in RANGE_OPTIONS:
+        compute_report(df, range_option, TODAY)
+    assert df.equals(before)
+    assert list(df.columns) == list(before.columns)
+
+
+def test_compute_report_last_7_days():
+    df = entries(600)
+    report = compute_report(df, "Last 7 days", TODAY)
+    week = df[df["date"] > TODAY - pd.Timedelta(days=7)]
+
+    assert report["mean_this_period"] == week["bpi5"].mean()
+    assert report["most_common_this"] in ("Neck", "Back")
+    # Daily points from the cutoff a week ago, for worst, least and average pain
+    assert len(report["trend"]) == 8 * 3
+    assert set(report["trend"]["Pain Type"]) == {"Worst", "Least", "Average"}
+    charted = df[df["date"] >= TODAY - pd.Timedelta(days=7)]
+    assert report["interference"]["Score"].tolist() == [
+        charted[field].mean() for field in SCORE_FIELDS[4:]]
+    treatment = dict(zip(report["treatment"]["bpi7_clean"], report["treatment"]["mean_bpi5"]))
+    assert set(treatment) == {"Yoga", "Walk", "None"}
+
+
+def test_compute_report_monthly_periods():
+    report = compute_report(entries(600), "All time", TODAY)
+    periods = report["trend"]["period"].drop_duplicates()
+    assert (periods.dt.day == 1).all()
+    assert len(periods) == 20
+
+
+@pytest.mark.parametrize("days", [600, 0])
+@pytest.mark.parametrize("range_option", RANGE_OPTIONS)
+def test_report_json_round_trip(range_option, days):
+    report = compute_report(entries(days), range_option, TODAY)
+    restored = report_from_json(json.loads(json.dumps(report_to_json(report))))
+
+    assert restored.keys() == report.keys()
+    for key, value in report.items():
+        if not isinstance(value, pd.DataFrame):
+            assert restored[key] == value or (pd.isna(restored[key]) and pd.isna(value))
+            continue
+        # An empty log has no rows to tell the string columns' dtype from
+        pd.testing.assert_frame_equal(restored[key], value.reset_index(drop=True),
+                                      check_dtype=days > 0)
+    assert pd.api.types.is_datetime64_any_dtype(restored["trend"]["period"])
+    assert restored["interference"]["Score"].dtype == float
+    if days == 0:
+        assert restored["interference"]["Score"].isna().all()
@@ -0,0 +1,62 @@
+import os
+import shared_dataset
+import storage
+from conftest import entry
+from shared_dataset import dataset_dir, load_entries, publish, read_pointer
+from storage import append_entries, compact
+
+
+def test_nothing_published(log):
+    append_entries([entry(0)], log)
+    assert load_entries(log) is None
+
+
+def test_published_entries_match_storage(log):
+    append_entries([entry(day, day % 11) for day in range(30)] + [entry(4, 10)], log)
+    compact(log)
+    append_entries([entry(2, 0)], log)
+    assert publish(log) == 1
+    assert load_entries(log).equals(storage.load_entries(log))
+
+
+def test_tail_overlay_and_generation_switch(log):
+    append_entries([entry(day, 1) for day in range(5)], log)
+    publish(log)
+    shared = load_entries(log)
+    assert load_entries(log) is shared
+
+    # Rows appended after publishing are overlaid without touching the shared frame
+    append_entries([entry(1, 7), entry(9, 3)], log)
+    df = load_entries(log)
+    assert len(df) == 6
+    assert df.loc[df["date"] == "2024-01-02", "bpi5"].tolist() == [7]
+    assert shared["bpi5"].tolist() == [1] * 5
+    # The merged frame is kept until the log changes again
+    assert load_entries(log) is df
+
+    # Publishing again switches readers to the new generation
+    assert publish(log) == 2
+    assert publish(log) == 2
+    assert read_pointer(log) == (2, os.path.getsize(log))
+    assert load_entries(log).equals(df)
+    assert shared_dataset.current[log]["generation"] == 2
+
+
+def test_old_generations_are_removed(log):
+    for day in range(4):
+        append_entries([entry(day)], log)
+        publish(log)
+    assert sorted(os.listdir(dataset_dir(log))) == [
+        "CURRENT", "gen-000003.arrow", "gen-000004.arrow"]
+
+
+def test_logs_are_cached_separately(log, tmp_path):
+    other = str(tmp_path / "other_log.csv")
+    append_entries([entry(0, 1)], log)
+    append_entries([entry(1, 9), entry(2, 9)], other)
+    # Both logs are at generation 1
+    assert publish(log) == publish(other) == 1
+
+    for _ in range(2):
+        assert load_entries(log)["bpi5"].tolist() == [1]
+        assert load_entries(other)["bpi5"].tolist() == [9, 9]
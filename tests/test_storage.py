@@ -0,0 +1,101 @@
+import os
+from conftest import entry
+from storage import (COLUMNS, append_entries, compact, load_entries,
+                     load_entries_with_offset, merge_tail, read_log_tail,
+                     read_manifest, snapshot_dir)
+
+
+def scores(df):
+    return dict(zip(df["date"].dt.strftime("%Y-%m-%d"), df["bpi5"]))
+
+
+def test_read_log_tail_skips_partial_last_line(log):
+    append_entries([entry(0), entry(1)], log)
+    complete = os.path.getsize(log)
+    with open(log, "a") as f:
+        f.write("03-01-2024;Yes;Ba")
+
+    tail, end = read_log_tail(log, 0)
+    assert len(tail) == 2
+    assert end == complete
+
+    # Once the writer finishes the line it is picked up from the same offset
+    with open(log, "a") as f:
+        f.write("ck;1;1;7;1;;0;0;0;0;0;0;0;0\n")
+    tail, _ = read_log_tail(log, end)
+    assert scores(tail) == {"2024-01-03": 7}
+
+
+def test_append_to_empty_log_writes_header(log):
+    open(log, "w").close()
+    append_entries([entry(0), entry(1)], log)
+    with open(log) as f:
+        assert f.readline().rstrip("\n").split(";") == COLUMNS
+    assert len(load_entries(log)) == 2
+
+
+def test_load_entries_sorts_and_dedupes_tail(log):
+    append_entries([entry(5, 1), entry(2, 2), entry(5, 3), entry(0, 4)], log)
+    df = load_entries(log)
+    assert list(df.columns) == COLUMNS
+    assert scores(df) == {"2024-01-01": 4, "2024-01-03": 2, "2024-01-06": 3}
+    assert df["date"].is_monotonic_increasing
+
+
+def test_tail_overrides_snapshot_across_boundary(log):
+    append_entries([entry(day, 1) for day in range(10)], log)
+    assert compact(log) == 10
+
+    # Older dates land in the tail, one of them replacing a compacted entry
+    append_entries([entry(20, 2), entry(3, 9), entry(-5, 6)], log)
+    df = load_entries(log)
+    assert len(df) == 12
+    assert df["date"].is_monotonic_increasing
+    assert scores(df)["2024-01-04"] == 9
+    assert scores(df)["2023-12-27"] == 6
+
+    # Folding the tail in changes nothing for readers
+    assert compact(log) == 3
+    manifest = read_manifest(log)
+    assert manifest["generation"] == 2
+    assert sorted(manifest["segments"]) == ["2023", "2024"]
+    assert load_entries(log).equals(df)
+
+
+def test_compact_without_new_rows(log):
+    append_entries([entry(0)], log)
+    assert compact(log) == 1
+    assert compact(log) == 0
+    assert read_manifest(log)["generation"] == 1
+
+
+def test_compact_removes_segments_of_older_generations(log):
+    for day in range(3):
+        append_entries([entry(day)], log)
+        compact(log)
+    segments = sorted(name for name in os.listdir(snapshot_dir(log)) if name.endswith(".parquet"))
+    # Current and previous generation only
+    assert segments == ["2024.g2.parquet", "2024.g3.parquet"]
+
+
+def test_cached_entries_follow_appends_and_compaction(log):
+    append_entries([entry(0, 1)], log)
+    first, offset = load_entries_with_offset(log)
+    again, again_offset = load_entries_with_offset(log)
+    assert again is first and again_offset == offset
+
+    append_entries([entry(0, 8), entry(1, 2)], log)
+    df, end = load_entries_with_offset(log)
+    assert end == os.path.getsize(log)
+    assert scores(df) == {"2024-01-01": 8, "2024-01-02": 2}
+    # The frame handed out earlier is left alone
+    assert scores(first) == {"2024-01-01": 1}
+
+    compact(log)
+    assert load_entries(log).equals(df)
+
+
+def test_merge_tail_keeps_snapshot_when_tail_is_empty(log):
+    append_entries([entry(0), entry(1)], log)
+    snapshot = load_entries(log)
+    assert merge_tail(snapshot, snapshot.iloc[:0]) is snapshot